@@ -5,12 +5,13 @@ postprocess_reports.py
 Gera relatório/métricas/plots e salva previsões usando o modelo selecionado (best_model.joblib)
 """
 
+import argparse
 import os
 import json
 import joblib
 import pandas as pd
 import numpy as np
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix, classification_report
+from sklearn.metrics import precision_recall_fscore_support, confusion_matrix, classification_report
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
@@ -21,24 +22,34 @@ def ensure_dir(p):
 
 def load_model(path):
     d = joblib.load(path)
-    # the train script saved {"model": clf, "features": feature_names}
+    # older train artifacts saved {"model": clf, "features": feature_names}
     if isinstance(d, dict) and "model" in d:
         return d["model"], d.get("features", None)
+    # current artifacts are bare estimators with a features.json sidecar
+    features_path = os.path.join(os.path.dirname(path), "features.json")
+    if os.path.exists(features_path):
+        with open(features_path, "r", encoding="utf-8") as f:
+            return d, json.load(f)
     return d, None
 
-def main():
+def main(args):
     processed_csv = "resources/processed_apple_quality.csv"
     artifacts_dir = "resources/artifacts_models"
     best_model_path = os.path.join(artifacts_dir, "best_model.joblib")
     reports_dir = os.path.join(artifacts_dir, "reports")
     ensure_dir(reports_dir)
 
-    if not os.path.exists(processed_csv):
-        raise FileNotFoundError(processed_csv)
     if not os.path.exists(best_model_path):
         raise FileNotFoundError(best_model_path)
 
-    df = pd.read_csv(processed_csv)
+    # prefer the typed Parquet written by the preprocessing step; CSV is the fallback
+    processed_parquet = os.path.splitext(processed_csv)[0] + ".parquet"
+    if os.path.exists(processed_parquet):
+        df = pd.read_parquet(processed_parquet)
+    elif os.path.exists(processed_csv):
+        df = pd.read_csv(processed_csv)
+    else:
+        raise FileNotFoundError(processed_csv)
     label_col = "Quality_encoded"
     if label_col not in df.columns:
         raise ValueError(f"Label column {label_col} not found in {processed_csv}")
@@ -49,34 +60,35 @@ def main():
     model, features = load_model(best_model_path)
 
     # If the saved model expects a particular feature order or dummy cols, try to adapt:
-    if features is not None:
-        # reconstruct X with the correct columns (if some missing, fill zeros)
-        X_df = pd.DataFrame(X)
-        X_aligned = pd.DataFrame(0, index=X_df.index, columns=features)
-        for c in X_df.columns:
-            if c in X_aligned.columns:
-                X_aligned[c] = X_df[c]
-        X_used = X_aligned.values
+    if features is not None and list(X.columns) == list(features):
+        # fast path: saved feature order already matches — no alignment needed
+        X_used = X.to_numpy(dtype=np.float32)
+    elif features is not None:
+        # reconstruct X with the correct columns via a single NumPy gather
+        # (missing columns stay zero-filled)
+        idx_map = {c: i for i, c in enumerate(features)}
+        src_cols = [c for c in X.columns if c in idx_map]
+        X_used = np.zeros((len(X), len(features)), dtype=np.float32)
+        X_used[:, [idx_map[c] for c in src_cols]] = X[src_cols].to_numpy(dtype=np.float32)
     else:
-        # fallback: convert to numeric matrix
+        # fallback: convert to numeric matrix (float32 halves the bytes predict touches)
         if not all(dtype.kind in 'iuf' for dtype in X.dtypes):
-            X_used = pd.get_dummies(X).values
+            X_used = pd.get_dummies(X).values.astype(np.float32, copy=False)
         else:
-            X_used = X.values
+            X_used = X.to_numpy(dtype=np.float32)
 
     y_pred = model.predict(X_used)
-    # probabilities (if available)
+    # probabilities (if available) — kept as a 2-D ndarray, one column per class
     probs = None
     if hasattr(model, "predict_proba"):
-        probs = model.predict_proba(X_used).tolist()
+        probs = model.predict_proba(X_used)
 
-    # metrics
-    acc = accuracy_score(y_true, y_pred)
-    prec = precision_score(y_true, y_pred, average="weighted", zero_division=0)
-    rec = recall_score(y_true, y_pred, average="weighted", zero_division=0)
-    f1 = f1_score(y_true, y_pred, average="weighted", zero_division=0)
-    report = classification_report(y_true, y_pred, output_dict=True, zero_division=0)
+    # metrics — one pass for the three weighted scores, accuracy derived from the
+    # confusion matrix instead of a separate scan over y_true/y_pred
     cm = confusion_matrix(y_true, y_pred)
+    acc = float(cm.trace() / cm.sum())
+    prec, rec, f1, _ = precision_recall_fscore_support(y_true, y_pred, average="weighted", zero_division=0)
+    report = classification_report(y_true, y_pred, output_dict=True, zero_division=0)
 
     # save metrics
     metrics = {
@@ -94,10 +106,15 @@ def main():
     out_pred_df["y_true"] = y_true
     out_pred_df["y_pred"] = y_pred
     if probs is not None:
-        # save probability for the positive class if binary, else all probs as JSON string
-        out_pred_df["y_proba"] = [json.dumps(p) for p in probs]
+        # one float column per class (proba_0, proba_1, ...) instead of JSON strings per row
+        proba_cols = [f"proba_{c}" for c in model.classes_]
+        out_pred_df[proba_cols] = probs
     out_pred_df.to_csv(os.path.join(reports_dir, "predictions.csv"), index=False)
-    out_pred_df.to_json(os.path.join(reports_dir, "predictions.json"), orient="records", force_ascii=False)
+    # JSON duplica o CSV e é caro de serializar — só gera quando pedido, e em
+    # formato line-delimited (um registro por linha, sem montar o array inteiro)
+    if args.emit_json:
+        out_pred_df.to_json(os.path.join(reports_dir, "predictions.json"),
+                            orient="records", lines=True, force_ascii=False)
 
     # save confusion matrix plot
     plt.figure(figsize=(6,5))
@@ -117,4 +134,8 @@ def main():
     }, ensure_ascii=False))
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emit-json", action="store_true",
+                        help="Também salva predictions.json (records, line-delimited)")
+    args = parser.parse_args()
+    main(args)
@@ -1,30 +1,54 @@
 #!/usr/bin/env python3
 import sys, json, os
+import functools
 import joblib
 import pandas as pd
 
-def main():
-    data = sys.stdin.read()
-    try:
-        payload = json.loads(data)
-    except Exception:
-        payload = {}
+MODEL_PATH = os.path.join('resources', 'artifacts', 'pipeline_full.joblib')
+
+@functools.lru_cache(maxsize=1)
+def _load_model(path, mtime):
+    # mtime keyed so a rebuilt pipeline_full.joblib invalidates the cache
+    return joblib.load(path)
+
+def handle(payload):
     record = payload.get("record", {})
-    model_path = os.path.join('resources', 'artifacts', 'pipeline_full.joblib')
-    if not os.path.exists(model_path):
-        print(json.dumps({"error":"pipeline_full.joblib not found. Run npm start to build."}))
-        return
-    model = joblib.load(model_path)
-    # ensure dataframe
+    if not os.path.exists(MODEL_PATH):
+        return {"error": "pipeline_full.joblib not found. Run npm start to build."}
+    model = _load_model(MODEL_PATH, os.path.getmtime(MODEL_PATH))
+    # ensure dataframe (float32 features: half the memory traffic in predict)
     df = pd.DataFrame([record])
+    float_cols = df.select_dtypes(include='float').columns
+    if len(float_cols):
+        df = df.astype({c: 'float32' for c in float_cols})
     try:
         preds = model.predict(df)
         out = {"prediction": int(preds[0])}
         if hasattr(model, "predict_proba"):
             out["proba"] = model.predict_proba(df).tolist()[0]
-        print(json.dumps(out))
+        return out
     except Exception as e:
-        print(json.dumps({"error": str(e)}))
+        return {"error": str(e)}
+
+def main():
+    if "--serve" in sys.argv:
+        # long-lived worker: model loads once, one JSON request/response per line
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                payload = json.loads(line)
+            except Exception:
+                payload = {}
+            print(json.dumps(handle(payload)), flush=True)
+        return
+    data = sys.stdin.read()
+    try:
+        payload = json.loads(data)
+    except Exception:
+        payload = {}
+    print(json.dumps(handle(payload)))
 
 if __name__ == "__main__":
     main()
@@ -23,7 +23,9 @@ function run(cmd, args) {
 try {
   const python = pythonInVenv();
   // adjust args as needed; we run preprocess_pipeline.py
-  run(python, ['src/preprocess_pipeline.py', '--input', 'resources/apple_quality.csv', '--out-dir', 'resources']);
+  // --emit-json: the renderer reloads resources/processed_apple_quality.json
+  // after each run (via the preload), so this consumer still needs the JSON
+  run(python, ['src/preprocess_pipeline.py', '--input', 'resources/apple_quality.csv', '--out-dir', 'resources', '--emit-json']);
   console.log('Preprocessing finished.');
 } catch (err) {
   console.error(err.message || err);
@@ -10,8 +10,9 @@ python src/preprocess_pipeline.py \
   --remove-outliers
 
 Outputs (padrão):
-resources/processed_apple_quality.csv
-resources/processed_apple_quality.json
+resources/processed_apple_quality.parquet
+resources/processed_apple_quality.csv   (com --emit-csv)
+resources/processed_apple_quality.json  (com --emit-json)
 resources/plots/correlation.png
 resources/artifacts/pipeline_preprocessor.joblib
 resources/artifacts/label_encoder.joblib
@@ -21,13 +22,15 @@ import argparse
 import json
 import os
 import logging
+import pickle
 from typing import Optional, List, Tuple, Dict, Any
 
 import numpy as np
 import pandas as pd
 import matplotlib
 matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import seaborn as sns
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
@@ -44,9 +47,31 @@ def ensure_dir(path: str):
         return
     os.makedirs(path, exist_ok=True)
 
-def load_csv(path: str) -> pd.DataFrame:
+# Dtypes conhecidos do dataset apple_quality: floats em float32 (metade da memória)
+# e label como category. Chaves ausentes no CSV são ignoradas pelo read_csv.
+APPLE_DTYPES: Dict[str, str] = {
+    "A_id": "int32",
+    "Size": "float32",
+    "Weight": "float32",
+    "Sweetness": "float32",
+    "Crunchiness": "float32",
+    "Juiciness": "float32",
+    "Ripeness": "float32",
+    "Acidity": "float32",
+    "Quality": "category",
+}
+
+def load_csv(path: str, drop_cols: Optional[List[str]] = None) -> pd.DataFrame:
     logger.info(f"Carregando CSV: {path}")
-    df = pd.read_csv(path)
+    usecols = None
+    if drop_cols:
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [c for c in header if c not in set(drop_cols)]
+    try:
+        df = pd.read_csv(path, dtype=APPLE_DTYPES, usecols=usecols, engine="pyarrow")
+    except (ImportError, ValueError):
+        # pyarrow não instalado (ou engine não suporta algum parâmetro)
+        df = pd.read_csv(path, dtype=APPLE_DTYPES, usecols=usecols, engine="c")
     logger.info(f"Shape inicial: {df.shape}")
     return df
 
@@ -59,49 +84,57 @@ def drop_columns(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
     return df
 
 def report_missing(df: pd.DataFrame) -> pd.Series:
+    # guard barato: um any() NumPy evita o sum/sort por coluna no caso comum (sem NaN)
+    if not df.isna().to_numpy().any():
+        logger.info("Nenhum valor ausente encontrado.")
+        return pd.Series(dtype="int64")
     miss = df.isnull().sum()
     miss = miss[miss > 0].sort_values(ascending=False)
-    if not miss.empty:
-        logger.info("Colunas com valores ausentes:\n" + miss.to_string())
-    else:
-        logger.info("Nenhum valor ausente encontrado.")
+    logger.info("Colunas com valores ausentes:\n" + miss.to_string())
     return miss
 
 def impute_basic(df: pd.DataFrame) -> pd.DataFrame:
     # Aplicado separadamente no pipeline também, mas mantemos uma versão "in place" para relatório inicial
+    if not df.isna().to_numpy().any():
+        return df
     num_cols = df.select_dtypes(include=[np.number]).columns.tolist()
     cat_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
-    for c in num_cols:
-        if df[c].isnull().any():
-            med = df[c].median()
-            df[c] = df[c].fillna(med)
-            logger.info(f"Imputado {c} (num) com mediana={med}")
-    for c in cat_cols:
-        if df[c].isnull().any():
-            mode = df[c].mode()
-            fill = mode.iloc[0] if not mode.empty else "unknown"
-            df[c] = df[c].fillna(fill)
-            logger.info(f"Imputado {c} (cat) com moda='{fill}'")
+    if num_cols:
+        with_nan = df[num_cols].isna().any()
+        if with_nan.any():
+            medians = df[num_cols].median()
+            df[num_cols] = df[num_cols].fillna(medians)
+            logger.info("Imputado (num) com mediana:\n" + medians[with_nan].to_string())
+    if cat_cols:
+        with_nan = df[cat_cols].isna().any()
+        if with_nan.any():
+            modes = df[cat_cols].mode().iloc[0].fillna("unknown")
+            df[cat_cols] = df[cat_cols].fillna(modes)
+            logger.info("Imputado (cat) com moda:\n" + modes[with_nan].to_string())
     return df
 
 def remove_duplicates(df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
     before = df.shape[0]
-    df2 = df.drop_duplicates()
+    # hash sobre floats arredondados (6 casas): chave menor e sem fragilidade de
+    # igualdade exata de ponto flutuante; colunas não numéricas entram como estão
+    dup_mask = df.round(6).duplicated()
+    df2 = df.loc[~dup_mask]
     removed = before - df2.shape[0]
     logger.info(f"Duplicatas removidas: {removed}")
     return df2, removed
 
 def detect_outliers_iqr(df: pd.DataFrame, numeric_cols: List[str], k: float = 1.5) -> pd.Series:
-    mask = pd.Series(False, index=df.index)
-    for c in numeric_cols:
-        q1 = df[c].quantile(0.25)
-        q3 = df[c].quantile(0.75)
-        iqr = q3 - q1
-        lower = q1 - k * iqr
-        upper = q3 + k * iqr
-        col_mask = (df[c] < lower) | (df[c] > upper)
-        mask |= col_mask
-        logger.debug(f"{c}: outliers={col_mask.sum()}, limits=({lower:.3f},{upper:.3f})")
+    # Todas as colunas de uma vez: um único quantile + broadcasting NumPy
+    arr = df[numeric_cols].to_numpy()
+    q1, q3 = np.nanquantile(arr, [0.25, 0.75], axis=0)
+    iqr = q3 - q1
+    lower = q1 - k * iqr
+    upper = q3 + k * iqr
+    outliers = (arr < lower) | (arr > upper)
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, c in enumerate(numeric_cols):
+            logger.debug(f"{c}: outliers={int(outliers[:, i].sum())}, limits=({lower[i]:.3f},{upper[i]:.3f})")
+    mask = pd.Series(outliers.any(axis=1), index=df.index)
     logger.info(f"Linhas com outliers (qualquer coluna): {int(mask.sum())}")
     return mask
 
@@ -111,13 +144,17 @@ def compute_and_save_correlation_plot(df: pd.DataFrame, out_path: str):
     if num.shape[1] < 2:
         logger.info("Não há colunas numéricas suficientes para plotar correlação.")
         return
-    corr = num.corr()
-    plt.figure(figsize=(10, 8))
-    sns.heatmap(corr, annot=True, fmt=".2f", cmap="coolwarm", square=True)
-    plt.title("Correlation matrix")
-    plt.tight_layout()
-    plt.savefig(out_path)
-    plt.close()
+    # np.corrcoef (BLAS, uma passada) em vez do corr() pairwise do pandas;
+    # após a imputação não há NaNs, então o tratamento pairwise é desnecessário
+    arr = num.to_numpy(copy=False)
+    corr = pd.DataFrame(np.corrcoef(arr, rowvar=False), index=num.columns, columns=num.columns)
+    # Figure + canvas Agg direto, sem passar pela máquina de estados do pyplot
+    fig = Figure(figsize=(10, 8))
+    ax = fig.add_subplot(111)
+    sns.heatmap(corr, annot=True, fmt=".2f", cmap="coolwarm", square=True, ax=ax)
+    ax.set_title("Correlation matrix")
+    fig.tight_layout()
+    FigureCanvasAgg(fig).print_png(out_path)
     logger.info(f"Salvo plot de correlação em: {out_path}")
 
 def encode_label(df: pd.DataFrame, label_col: str = "Quality") -> Tuple[pd.DataFrame, Any]:
@@ -126,8 +163,11 @@ def encode_label(df: pd.DataFrame, label_col: str = "Quality") -> Tuple[pd.DataF
     labels = df[label_col].dropna().unique().tolist()
     lowered = [str(x).lower() for x in labels]
     if set(lowered) == {"good", "bad"}:
+        # uma passada sobre os códigos categóricos, sem lower/map por linha
         mapping = {"good": 1, "bad": 0}
-        df[label_col + "_encoded"] = df[label_col].astype(str).str.lower().map(mapping)
+        cat = df[label_col].astype("category")
+        good_code = next(i for i, c in enumerate(cat.cat.categories) if str(c).lower() == "good")
+        df[label_col + "_encoded"] = np.where(cat.cat.codes == good_code, 1, 0).astype(np.int8)
         encoder = mapping
         logger.info("Usado mapping {'good':1,'bad':0} para codificação.")
     else:
@@ -137,59 +177,87 @@ def encode_label(df: pd.DataFrame, label_col: str = "Quality") -> Tuple[pd.DataF
         logger.info(f"LabelEncoder usado. Classes: {list(le.classes_)}")
     return df, encoder
 
-def build_preprocessor(df: pd.DataFrame, exclude_label_col: Optional[str] = None) -> Tuple[ColumnTransformer, List[str]]:
+def build_preprocessor(df: pd.DataFrame, exclude_label_col: Optional[str] = None,
+                       cache_dir: Optional[str] = None) -> Tuple[Any, List[str]]:
     # Detecta colunas numéricas e categóricas automaticamente (após remoção da label)
+    # cache_dir: memoiza fit_transform dos transformadores em disco (joblib.Memory),
+    # então reexecuções sobre o mesmo input reaproveitam o trabalho já feito
+    memory = joblib.Memory(cache_dir, verbose=0) if cache_dir else None
     num_cols = df.select_dtypes(include=[np.number]).columns.tolist()
     if exclude_label_col and exclude_label_col in num_cols:
         num_cols = [c for c in num_cols if c != exclude_label_col]
     cat_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
 
     # Imputer + scaler para numéricos, imputer + ord encoder para categóricos (se existirem)
-    transformers = []
+    num_pipeline = None
     if num_cols:
         num_pipeline = Pipeline([
             ("imputer", SimpleImputer(strategy="median")),
             ("scaler", StandardScaler())
-        ])
+        ], memory=memory)
+
+    # Fast path: só numéricos (o caso real deste dataset) — um Pipeline simples evita
+    # o overhead de validação/seleção de colunas do ColumnTransformer a cada fit/transform
+    if num_cols and not cat_cols:
+        logger.info(f"Preprocessor built (numeric fast path). Num cols: {num_cols}")
+        return num_pipeline, num_cols
+
+    transformers = []
+    if num_pipeline is not None:
         transformers.append(("num", num_pipeline, num_cols))
 
     if cat_cols:
         cat_pipeline = Pipeline([
             ("imputer", SimpleImputer(strategy="most_frequent")),
             ("ord_enc", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1))
-        ])
+        ], memory=memory)
         transformers.append(("cat", cat_pipeline, cat_cols))
 
     preprocessor = ColumnTransformer(transformers=transformers, remainder="drop", sparse_threshold=0)
     logger.info(f"Preprocessor built. Num cols: {num_cols}, Cat cols: {cat_cols}")
     return preprocessor, num_cols + cat_cols
 
-def save_artifacts(out_dir: str, preprocessor: ColumnTransformer, label_encoder: Any):
+def save_artifacts(out_dir: str, preprocessor: Any, label_encoder: Any):
     artifacts_dir = os.path.join(out_dir, "artifacts")
     ensure_dir(artifacts_dir)
     preprocessor_path = os.path.join(artifacts_dir, "pipeline_preprocessor.joblib")
     label_path = os.path.join(artifacts_dir, "label_encoder.joblib")
-    joblib.dump(preprocessor, preprocessor_path)
-    joblib.dump(label_encoder, label_path)
+    # compressão moderada + protocolo 5 (buffers numpy fora de banda): arquivos
+    # menores e load/dump mais rápidos que o pickle default do joblib
+    joblib.dump(preprocessor, preprocessor_path, compress=3, protocol=pickle.HIGHEST_PROTOCOL)
+    joblib.dump(label_encoder, label_path, compress=3, protocol=pickle.HIGHEST_PROTOCOL)
     logger.info(f"Preprocessor salvo: {preprocessor_path}")
     logger.info(f"Label encoder salvo: {label_path}")
     return artifacts_dir
 
-def save_processed(df: pd.DataFrame, out_dir: str, base_name: str = "processed_apple_quality"):
+def save_processed(df: pd.DataFrame, out_dir: str, base_name: str = "processed_apple_quality",
+                   emit_csv: bool = False, emit_json: bool = False):
     ensure_dir(out_dir)
+    parquet_path = os.path.join(out_dir, f"{base_name}.parquet")
     csv_path = os.path.join(out_dir, f"{base_name}.csv")
     json_path = os.path.join(out_dir, f"{base_name}.json")
-    df.to_csv(csv_path, index=False)
-    df.to_json(json_path, orient="records", force_ascii=False)
-    logger.info(f"CSV salvo: {csv_path}")
-    logger.info(f"JSON salvo: {json_path}")
-    return csv_path, json_path
+    try:
+        df.to_parquet(parquet_path, engine="pyarrow", compression="zstd")
+        logger.info(f"Parquet salvo: {parquet_path}")
+    except ImportError:
+        # sem pyarrow: CSV volta a ser o formato canônico
+        parquet_path = None
+        emit_csv = True
+    if emit_csv:
+        df.to_csv(csv_path, index=False)
+        logger.info(f"CSV salvo: {csv_path}")
+    else:
+        csv_path = None
+    if emit_json:
+        df.to_json(json_path, orient="records", force_ascii=False)
+        logger.info(f"JSON salvo: {json_path}")
+    else:
+        json_path = None
+    return parquet_path, csv_path, json_path
 
 def main(args):
-    df = load_csv(args.input)
-    # Step 1: drop cols
-    if args.drop_cols:
-        df = drop_columns(df, args.drop_cols)
+    # Step 1: load (colunas descartadas já no parse, via usecols)
+    df = load_csv(args.input, drop_cols=args.drop_cols)
 
     # Step 2: report & impute (quick)
     report_missing(df)
@@ -203,7 +271,8 @@ def main(args):
     if args.remove_outliers and numeric_cols:
         mask = detect_outliers_iqr(df, numeric_cols, k=args.iqr_k)
         before = df.shape[0]
-        df = df.loc[~mask].copy()
+        # boolean loc já materializa um novo frame; o .copy() extra só dobrava o tráfego de memória
+        df = df.loc[~mask]
         logger.info(f"Removed {before - df.shape[0]} rows by IQR outliers (k={args.iqr_k})")
     else:
         logger.info("Remoção de outliers não solicitada/sem colunas numéricas.")
@@ -218,7 +287,8 @@ def main(args):
 
     # Step 7: build preprocessor excluding label encoded
     exclude_label = args.label_col + "_encoded"
-    preprocessor, feature_cols = build_preprocessor(df.drop(columns=[args.label_col]), exclude_label_col=exclude_label)
+    preprocessor, feature_cols = build_preprocessor(df.drop(columns=[args.label_col]), exclude_label_col=exclude_label,
+                                                    cache_dir=os.path.join(args.out_dir, "cache"))
 
     # Fit preprocessor on features (we pass df without original label but keeping encoded label removed)
     # Create X (features) from df dropping both original label and encoded label
@@ -237,13 +307,14 @@ def main(args):
     transformed_cols = feature_cols  # matches the columns we passed to ColumnTransformer
     df_transformed = pd.DataFrame(X_transformed, columns=transformed_cols, index=df.index)
 
-    # Reattach label encoded
-    df_final = df_transformed.copy()
-    df_final[exclude_label] = df[exclude_label].values
+    # Reattach label encoded (df_transformed acabou de ser criado e não tem outro dono — sem copy)
+    df_transformed[exclude_label] = df[exclude_label].to_numpy(copy=False)
+    df_final = df_transformed
 
     # Save processed files and artifacts
     out_data_dir = args.out_dir
-    csv_out, json_out = save_processed(df_final, out_data_dir, base_name=args.out_basename)
+    parquet_out, csv_out, json_out = save_processed(df_final, out_data_dir, base_name=args.out_basename,
+                                                    emit_csv=args.emit_csv, emit_json=args.emit_json)
     artifacts_dir = save_artifacts(out_data_dir, preprocessor, label_encoder)
 
     # Save plots dir ensured
@@ -254,6 +325,7 @@ def main(args):
         "status": "success",
         "rows_total": int(df_final.shape[0]),
         "columns": df_final.columns.tolist(),
+        "processed_parquet": parquet_out,
         "processed_csv": csv_out,
         "processed_json": json_out,
         "plots": corr_path,
@@ -274,6 +346,10 @@ if __name__ == "__main__":
                         help="Nome da coluna label (default: Quality)")
     parser.add_argument("--out-basename", default="processed_apple_quality",
                         help="Base name para arquivos de saída (default: processed_apple_quality)")
+    parser.add_argument("--emit-csv", action="store_true",
+                        help="Também salva o CSV processado (Parquet é o padrão)")
+    parser.add_argument("--emit-json", action="store_true",
+                        help="Também salva o JSON processado")
     parser.add_argument("--remove-outliers", action="store_true",
                         help="Remover outliers por IQR")
     parser.add_argument("--iqr-k", type=float, default=1.5,
